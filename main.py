@@ -1,130 +1,145 @@
 import os
-import json
-import hashlib
+import sys
 import time
+import argparse
+from datetime import datetime
 from simple_vcs import SimpleVCS
 
 # Constants for repository structure and files
 REPO_DIR = ".repo"  # Main repository directory
 COMMITS_DIR = os.path.join(REPO_DIR, "commits")  # Directory to store commits
-BRANCHES_FILE = os.path.join(REPO_DIR, "branches.json")  # Tracks branches
-INDEX_FILE = os.path.join(REPO_DIR, "index.json")  # Tracks staged files
+DB_FILE = os.path.join(REPO_DIR, "repo.db")  # Tracks branches, commits and staged files
 HEAD_FILE = os.path.join(REPO_DIR, "HEAD")  # Tracks current branch
 
 # Repository path
 REPO_PATH = "my_repo"
 
-# Initialize the SimpleVCS system
-vcs = SimpleVCS(REPO_PATH)
 
-if __name__ == "__main__":
-    import argparse
+# Argument builders, one per command. Only the builder for the selected
+# command runs, so a normal invocation never constructs the whole parser tree.
 
+def build_add_parser(parser):
+    parser.add_argument("--file", required=True, nargs="+", help="Files to add")
 
+def build_commit_parser(parser):
+    parser.add_argument("--message", required=True, help="Commit message")
 
-#vcs = SimpleVCS(".")
+def iso_timestamp(value):
+    """Parse an ISO 8601 date or datetime into a Unix timestamp."""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r} (expected YYYY-MM-DD[THH:MM:SS])")
 
-# Set up command-line argument parsing
-import argparse
+def build_history_parser(parser):
+    parser.add_argument("--limit", type=int, help="Show at most this many commits")
+    parser.add_argument("--since", type=iso_timestamp, help="Only show commits made after this date")
+
+def build_branch_parser(parser):
+    branch_subparsers = parser.add_subparsers(dest="branch_command", required=True)
+
+    # Create branch
+    create_branch_parser = branch_subparsers.add_parser("create", help="Create a new branch")
+    create_branch_parser.add_argument("--name", required=True, help="Name of the new branch")
+
+    # List branches
+    branch_subparsers.add_parser("list", help="List all branches")
+
+    # Switch branch
+    switch_branch_parser = branch_subparsers.add_parser("switch", help="Switch to a branch")
+    switch_branch_parser.add_argument("--name", required=True, help="Branch name to switch to")
+
+def build_clone_parser(parser):
+    parser.add_argument("target_path", help="Target path for cloning")
+
+def build_add_ignore_parser(parser):
+    parser.add_argument("patterns", nargs="+", help="Patterns to ignore")
+
+def build_diff_parser(parser):
+    parser.add_argument("branch1", help="First branch for comparison")
+    parser.add_argument("branch2", help="Second branch for comparison")
+
+def build_merge_parser(parser):
+    parser.add_argument("source_branch", help="Source branch to merge from")
+    parser.add_argument("target_branch", help="Target branch to merge into")
 
-# Main parser
-parser = argparse.ArgumentParser(description="Mini Source Control System")
-subparsers = parser.add_subparsers(dest="command", required=True, help="Main commands")
-
-# Init command
-subparsers.add_parser("init", help="Initialize a repository")
-
-# Add command
-add_parser = subparsers.add_parser("add", help="Add files to the repository")
-add_parser.add_argument("--file", required=True, help="File to add")
-
-# Commit command
-commit_parser = subparsers.add_parser("commit", help="Commit changes to the repository")
-commit_parser.add_argument("--message", required=True, help="Commit message")
-
-# Push command
-subparsers.add_parser("push", help="Push files from a branch to remote")
-
-# History command
-subparsers.add_parser("history", help="View commit history")
-
-# Branch management
-branch_parser = subparsers.add_parser("branch", help="Branch management commands")
-branch_subparsers = branch_parser.add_subparsers(dest="branch_command", required=True)
-
-# Create branch
-create_branch_parser = branch_subparsers.add_parser("create", help="Create a new branch")
-create_branch_parser.add_argument("--name", required=True, help="Name of the new branch")
-
-# List branches
-branch_subparsers.add_parser("list", help="List all branches")
-
-# Switch branch
-switch_branch_parser = branch_subparsers.add_parser("switch", help="Switch to a branch")
-switch_branch_parser.add_argument("--name", required=True, help="Branch name to switch to")
-
-# Clone command
-clone_parser = subparsers.add_parser("clone", help="Clone the repository")
-clone_parser.add_argument("target_path", help="Target path for cloning")
-
-# Add ignore patterns
-add_ignore_parser = subparsers.add_parser("add_ignore", help="Add ignore patterns")
-add_ignore_parser.add_argument("patterns", nargs="+", help="Patterns to ignore")
-
-# List files
-subparsers.add_parser("list_files", help="List files in the repository")
-
-# Diff command
-diff_parser = subparsers.add_parser("diff", help="Show differences between branches")
-diff_parser.add_argument("branch1", help="First branch for comparison")
-diff_parser.add_argument("branch2", help="Second branch for comparison")
-
-# Merge command
-merge_parser = subparsers.add_parser("merge", help="Merge branches")
-merge_parser.add_argument("source_branch", help="Source branch to merge from")
-merge_parser.add_argument("target_branch", help="Target branch to merge into")
-
-# Parse arguments
-args = parser.parse_args()
-print(args)
-
-# Parse arguments
-args = parser.parse_args()
-
-# Route commands to their respective functions
-if args.command == "init":
-    vcs.init()
-elif args.command == "add":
-    if args.file:
-        vcs.add(args.file)
-    else:
-        print("Specify a file to add using --file.")
-elif args.command == "commit":
-    if args.message:
-        vcs.commit(args.message)
-    else:
-        print("Specify a commit message using --message.")
-elif args.command == "push":
-    vcs.push()
-elif args.command == "history":
-    vcs.history()
-elif args.command == "branch":
+
+# Command handlers
+
+def run_branch(vcs, args):
     if args.branch_command == "create":
         vcs.create_branch(args.name)
     elif args.branch_command == "list":
         vcs.list_branches()
     elif args.branch_command == "switch":
         vcs.switch_branch(args.name)
-elif args.command == "clone":
-    vcs.clone(args.target_path)
-elif args.command == "add_ignore":
-    vcs.add_ignore(args.patterns)
-elif args.command == "list_files":
+
+def run_history(vcs, args):
+    if not vcs.repo_dir.exists():
+        print("Repository not initialized. Run 'init' first.")
+        return
+
+    current_branch = vcs.head
+    if not vcs.branches.get(current_branch):
+        print(f"No commits in branch '{current_branch}'.")
+        return
+
+    print(f"Commit history for branch '{current_branch}':")
+    for commit_hash, timestamp, message in vcs.history(args.limit, args.since):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+        print(f"- {commit_hash[:7]} | {timestamp} | {message}")
+
+def run_list_files(vcs, args):
     for file in vcs.list_files():
         print(file)
-elif args.command == "diff":
-    vcs.diff(args.branch1, args.branch2)
-elif args.command == "merge":
-    vcs.merge(args.source_branch, args.target_branch)
-else:
-    parser.print_help()
+
+
+# Command name -> (help text, argument builder or None, handler)
+COMMANDS = {
+    "init": ("Initialize a repository", None, lambda vcs, args: vcs.init()),
+    "add": ("Add files to the repository", build_add_parser, lambda vcs, args: vcs.add(args.file)),
+    "commit": ("Commit changes to the repository", build_commit_parser, lambda vcs, args: vcs.commit(args.message)),
+    "push": ("Push files from a branch to remote", None, lambda vcs, args: vcs.push()),
+    "history": ("View commit history", build_history_parser, run_history),
+    "branch": ("Branch management commands", build_branch_parser, run_branch),
+    "clone": ("Clone the repository", build_clone_parser, lambda vcs, args: vcs.clone(args.target_path)),
+    "add_ignore": ("Add ignore patterns", build_add_ignore_parser, lambda vcs, args: vcs.add_ignore(args.patterns)),
+    "list_files": ("List files in the repository", None, run_list_files),
+    "diff": ("Show differences between branches", build_diff_parser, lambda vcs, args: vcs.diff(args.branch1, args.branch2)),
+    "merge": ("Merge branches", build_merge_parser, lambda vcs, args: vcs.merge(args.source_branch, args.target_branch)),
+}
+
+
+def build_full_parser():
+    """Build the parser for every command; only needed for top-level help and usage errors."""
+    parser = argparse.ArgumentParser(description="Mini Source Control System")
+    subparsers = parser.add_subparsers(dest="command", required=True, help="Main commands")
+    for name, (help_text, build, _) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if build:
+            build(subparser)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else None
+
+    if command not in COMMANDS:
+        # Prints help or a usage error and exits
+        build_full_parser().parse_args(argv)
+        return
+
+    help_text, build, handler = COMMANDS[command]
+    parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} {command}", description=help_text)
+    if build:
+        build(parser)
+    args = parser.parse_args(argv[1:])
+
+    # Initialize the SimpleVCS system
+    vcs = SimpleVCS(REPO_PATH)
+    handler(vcs, args)
+
+
+if __name__ == "__main__":
+    main()
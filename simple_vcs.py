@@ -1,19 +1,80 @@
 import os
-import json
+import re
+import errno
+import sys
+import mmap
+import fnmatch
+import bisect
 import hashlib
+import struct
 import time
 import shutil
+import sqlite3
 import logging
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from unittest.mock import patch
 from difflib import unified_diff
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    from blake3 import blake3
+except ImportError:  # Optional: object hashing falls back to SHA-1
+    blake3 = None
+
 # Set up a logger for SimpleVCS
 logger = logging.getLogger("SimpleVCS")
 logger.setLevel(logging.INFO)  # Set the level to INFO
-handler = logging.StreamHandler()
-handler.setLevel(logging.INFO)
-logger.addHandler(handler)
+if not logger.handlers:  # Don't stack handlers if the module is reloaded
+    handler = logging.StreamHandler()
+    handler.setLevel(logging.INFO)
+    logger.addHandler(handler)
+
+# Object ID algorithm for new repositories. Each repository records the one it was created
+# with, so installing or removing blake3 later never mixes IDs within it
+DEFAULT_HASH_ALGORITHM = "blake3" if blake3 is not None else "sha1"
+
+# Header of each record in commits.pack: raw commit hash and payload length
+PACK_HEADER = struct.Struct("<20sI")
+
+# Fixed-size record in commits.idx, kept sorted by commit hash: commit hash, parent hash,
+# and offset and length of the commit payload in commits.pack
+INDEX_RECORD = struct.Struct("<20s20sQI")
+
+# Parent hash stored for a branch's first commit
+NO_PARENT = bytes(20)
+
+# Worker threads for I/O-bound fan-out (file comparisons); threads release the GIL on disk reads
+IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Per-commit manifest mapping each file in a commit directory to its blob hash. Dot-prefixed
+# and reserved, so it never collides with a committed tree.json
+TREE_FILE = ".tree.json"
+
+# Commit message stored alongside the files of each commit directory
+MESSAGE_FILE = "message.txt"
+
+# Per-branch counter holding the number of the next commit directory
+NEXT_COMMIT_FILE = ".next"
+
+# Names that commit directories reserve for metadata, so they cannot be staged
+RESERVED_NAMES = (MESSAGE_FILE, TREE_FILE)
+
+# .repo subdirectories whose files are replaced but never modified in place, so clones can
+# hardlink them instead of copying
+SHARED_DIRS = ("objects", "trees", "commits")
+
+# Buffer size for the userspace copy fallback
+COPY_BUFSIZE = 1 << 20
+
+# ioctl request for a copy-on-write reflink on btrfs/XFS (not exposed by fcntl before Python 3.12)
+FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
 
 class SimpleVCS:
     def __init__(self, repo_path):
@@ -21,13 +82,456 @@ class SimpleVCS:
         self.repo_dir = self.repo_path / ".repo"
         self.remote_dir = self.repo_path / ".remote"
         self.commits_dir = self.repo_dir / "commits"
-        self.branches_file = self.repo_dir / "branches.json"
-        self.index_file = self.repo_dir / "index.json"
+        self.db_file = self.repo_dir / "repo.db"
+        self.pack_file = self.repo_dir / "commits.pack"
+        self.pack_index_file = self.repo_dir / "commits.idx"
+        self.trees_dir = self.repo_dir / "trees"
+        self.objects_dir = self.repo_dir / "objects"
         self.head_file = self.repo_dir / "HEAD"
         self.ignore_file = self.repo_path / ".ignore"
+        self._ignore_cache = None  # ((mtime, size) of .ignore, compiled pattern)
+        self._head_cache = None  # ((inode, mtime, size) of HEAD, branch name)
+        self._ignore_matcher = None  # (compiled pattern, memoized name -> bool)
+        self._map_cache = {}  # {path: ((inode, mtime, size), mmap)} for commits.pack/.idx
+        self._commits = {}  # {commit_hash: (parent, timestamp, message)} decoded so far
+        self._no_reflink_devs = set()  # st_dev of filesystems that rejected FICLONE
+        self._conn = None
+        self._hash_algorithm = None  # Object ID algorithm recorded in repo.db
+        self._db_version = None  # PRAGMA data_version the cached state was loaded at
+        self._branches = None
+        self._index = None
+
+    def _connection(self, create=False):
+        """
+        Return the repository database connection, opening it on first use.
+
+        The database is only created when create is set (by init()); otherwise a missing
+        database, or one without the expected tables, raises RuntimeError instead of
+        leaving an empty repo.db behind.
+        """
+        if self._conn is None:
+            uri = f"{self.db_file.absolute().as_uri()}?mode={'rwc' if create else 'rw'}"
+            try:
+                conn = sqlite3.connect(uri, uri=True)
+            except sqlite3.OperationalError:
+                conn = None
+            if not create and (conn is None or not self._has_schema(conn)):
+                if conn is not None:
+                    conn.close()
+                raise RuntimeError(self._format_error())
+            self._conn = conn
+            self._db_version = None  # data_version is only comparable within one connection
+        return self._conn
+
+    def _has_schema(self, conn):
+        """
+        Whether a database has the tables this version stores branches and the index in.
+        """
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return {"index", "branches"} <= tables
+
+    def _format_error(self):
+        """
+        Explain why the repository database cannot be used.
+        """
+        if (self.repo_dir / "branches.json").exists() or (self.repo_dir / "index.json").exists():
+            return (
+                f"Repository format too old: '{self.repo_dir}' keeps its state in "
+                "branches.json/index.json. Re-initialize it with this version."
+            )
+        return f"Repository database '{self.db_file}' is missing or incomplete."
+
+    def _sync(self):
+        """
+        Drop cached branches and index if another connection has committed to the database.
+
+        Writes made through this instance's own connection do not change data_version, so
+        they keep the cache warm.
+        """
+        (version,) = self._connection().execute("PRAGMA data_version").fetchone()
+        if version != self._db_version:
+            self._db_version = version
+            self._branches = None
+            self._index = None
+
+    @contextmanager
+    def _db(self):
+        """
+        Run a transaction on the repository database, committing on success and rolling back on error.
+        """
+        conn = self._connection()
+        with conn:
+            yield conn
+
+    def close(self):
+        """
+        Close the database connection and release cached file mappings.
+
+        The instance stays usable; both are reopened on demand.
+        """
+        for path in list(self._map_cache):
+            self._unmap(path)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @property
+    def head(self):
+        """
+        Name of the current branch, re-read from HEAD only when the file changes.
+
+        HEAD is a few bytes, so it is read with a single os.read() instead of through a
+        file object.
+        """
+        st = os.stat(self.head_file)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._head_cache is None or self._head_cache[0] != key:
+            fd = os.open(self.head_file, os.O_RDONLY)
+            try:
+                name = os.read(fd, max(st.st_size, 256)).strip().decode()
+            finally:
+                os.close(fd)
+            self._head_cache = (key, name)
+        return self._head_cache[1]
+
+    @property
+    def branches(self):
+        """
+        {branch_name: commit_hash} for all branches, cached until another process changes them.
+        """
+        self._sync()
+        if self._branches is None:
+            self._branches = dict(
+                self._connection().execute("SELECT name, commit_hash FROM branches ORDER BY rowid")
+            )
+        return self._branches
+
+    @property
+    def index(self):
+        """
+        {path: mtime_ns} for all staged files, cached until another process changes them.
+        """
+        self._sync()
+        if self._index is None:
+            self._index = dict(self._connection().execute('SELECT path, mtime_ns FROM "index"'))
+        return self._index
+
+    def _map(self, path):
+        """
+        Map a file read-only, reusing the mapping until the file's stat signature changes.
+
+        Args:
+            path (Path): File to map.
+
+        Returns:
+            bytes-like: The mapping, or an empty bytes object for a missing or empty file.
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._unmap(path)
+            return b""
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self._map_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        self._unmap(path)
+        if st.st_size == 0:  # mmap refuses empty files
+            return b""
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map_cache[path] = (signature, mm)
+        return mm
+
+    def _unmap(self, path):
+        """
+        Close the cached mapping of a file, if any.
+        """
+        cached = self._map_cache.pop(path, None)
+        if cached is not None:
+            cached[1].close()
+
+    def _bisect_index(self, index, key):
+        """
+        Position of the first record in commits.idx whose hash is not less than key.
+        """
+        size = INDEX_RECORD.size
+        return bisect.bisect_left(
+            range(len(index) // size), key, key=lambda i: index[i * size:i * size + 20]
+        )
+
+    def _find_commit(self, index, commit_hash):
+        """
+        Look up a commit in commits.idx by binary search.
+
+        Args:
+            index (bytes-like): Contents of commits.idx, usually from _map().
+            commit_hash (str): Hex commit hash.
+
+        Returns:
+            tuple: (offset, length, parent) of the commit in commits.pack, or None if unknown.
+        """
+        key = bytes.fromhex(commit_hash)
+        start = self._bisect_index(index, key) * INDEX_RECORD.size
+        if start >= len(index):
+            return None
+        found, parent, offset, length = INDEX_RECORD.unpack_from(index, start)
+        if found != key:
+            return None
+        return offset, length, parent.hex() if parent != NO_PARENT else None
+
+    def _append_commit(self, commit_data):
+        """
+        Append a commit record to commits.pack and insert it into the sorted commits.idx.
+
+        Args:
+            commit_data (dict): Commit metadata (message, timestamp, parent, tree).
+
+        Returns:
+            str: The commit hash, a BLAKE2b digest of the serialized record.
+        """
+        payload = orjson.dumps(commit_data)
+        commit_hash = hashlib.blake2b(payload, digest_size=20, usedforsecurity=False).hexdigest()
+        record = PACK_HEADER.pack(bytes.fromhex(commit_hash), len(payload)) + payload
+
+        fd = os.open(self.pack_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            offset = os.fstat(fd).st_size + PACK_HEADER.size
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+
+        key = bytes.fromhex(commit_hash)
+        parent = commit_data["parent"]
+        record = INDEX_RECORD.pack(
+            key, bytes.fromhex(parent) if parent else NO_PARENT, offset, len(payload)
+        )
+        tmp_file = self.pack_index_file.with_suffix(".tmp")
+        index = self._map(self.pack_index_file)
+        start = self._bisect_index(index, key) * INDEX_RECORD.size
+        end = start
+        if index[start:start + 20] == key:  # Re-committed identical payload
+            end += INDEX_RECORD.size
+        with tmp_file.open("wb") as index_file:
+            index_file.write(b"".join((index[:start], record, index[end:])))
+        self._unmap(self.pack_index_file)  # An open mapping blocks os.replace on Windows
+        os.replace(tmp_file, self.pack_index_file)
+        self._commits[commit_hash] = (parent, commit_data["timestamp"], commit_data["message"])
+        return commit_hash
+
+    def _walk_commits(self, commit_hash):
+        """
+        Yield (commit_hash, timestamp, message) from commit_hash back to the first commit.
+
+        Commits are decoded from the pack only when the walk reaches them and are kept in
+        the in-memory commit table; they are immutable, so repeated walks are dict lookups
+        and callers that stop early never decode the rest of the chain.
+        """
+        commits = self._commits
+        while commit_hash:
+            commit = commits.get(commit_hash)
+            if commit is None:
+                entry = self._find_commit(self._map(self.pack_index_file), commit_hash)
+                if entry is None:
+                    return
+                offset, length, parent = entry
+                commit_data = orjson.loads(self._map(self.pack_file)[offset:offset + length])
+                commit = (parent, commit_data["timestamp"], commit_data["message"])
+                commits[commit_hash] = commit
+
+            parent, timestamp, message = commit
+            yield commit_hash, timestamp, message
+            commit_hash = parent
+
+    def _write_tree(self, entries):
+        """
+        Store a file manifest as a content-addressed blob under .repo/trees.
+
+        Identical manifests hash to the same blob, which is only written once.
+
+        Args:
+            entries (dict): Manifest mapping file paths to their recorded state.
+
+        Returns:
+            str: The tree hash, a BLAKE2b digest of the canonical JSON manifest.
+        """
+        payload = orjson.dumps(entries, option=orjson.OPT_SORT_KEYS)
+        tree_hash = hashlib.blake2b(payload, digest_size=20, usedforsecurity=False).hexdigest()
+
+        tree_file = self.trees_dir / tree_hash
+        if not tree_file.exists():
+            self.trees_dir.mkdir(exist_ok=True)
+            tmp_file = tree_file.with_suffix(".tmp")
+            tmp_file.write_bytes(payload)
+            os.replace(tmp_file, tree_file)
+        return tree_hash
+
+    def _read_tree(self, tree_hash):
+        """
+        Load the file manifest stored under the given tree hash.
+        """
+        return orjson.loads((self.trees_dir / tree_hash).read_bytes())
+
+    def _hash_file(self, path):
+        """
+        Return the hex digest identifying a file's contents in the object store.
+
+        Uses the repository's recorded algorithm: multithreaded BLAKE3 over an mmap of the
+        file, or SHA-1 over an mmap.
+        """
+        if self._object_hash_algorithm() == "blake3":
+            if blake3 is None:
+                raise RuntimeError(
+                    "This repository identifies objects with BLAKE3; install the blake3 package."
+                )
+            hasher = blake3(max_threads=blake3.AUTO)
+            hasher.update_mmap(path)
+            return hasher.hexdigest()
+
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hashlib.sha1(b"").hexdigest()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha1(mm).hexdigest()
+
+    def _object_hash_algorithm(self):
+        """
+        Name of the algorithm this repository uses for object IDs, as recorded in repo.db.
+
+        Repositories created before the algorithm was recorded adopt this machine's default
+        on first use, so their IDs stop mixing from then on.
+        """
+        if self._hash_algorithm is None:
+            conn = self._connection()
+            try:
+                row = conn.execute("SELECT value FROM config WHERE key = 'object_hash'").fetchone()
+            except sqlite3.OperationalError:  # No config table yet
+                row = None
+            if row is None:
+                with self._db() as conn:
+                    conn.execute("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
+                    conn.execute(
+                        "INSERT OR IGNORE INTO config VALUES ('object_hash', ?)",
+                        (DEFAULT_HASH_ALGORITHM,),
+                    )
+                    row = conn.execute("SELECT value FROM config WHERE key = 'object_hash'").fetchone()
+            self._hash_algorithm = row[0]
+        return self._hash_algorithm
+
+    def _hashes_comparable(self, hash1, hash2):
+        """
+        Whether two blob hashes can decide equality on their own.
+
+        Both must be known and come from the same algorithm, told apart by digest length
+        (40 hex characters for SHA-1, 64 for BLAKE3); hashes of identical content under
+        different algorithms differ, so such pairs have to be compared by content.
+        """
+        return hash1 is not None and hash2 is not None and len(hash1) == len(hash2)
+
+    def _store_object(self, src, blob_hash):
+        """
+        Move a file into the object store under its content hash.
+
+        If the object already exists the file is a duplicate and is simply removed.
+
+        Returns:
+            Path: Location of the object.
+        """
+        object_path = self.objects_dir / blob_hash[:2] / blob_hash[2:]
+        if object_path.exists():
+            os.unlink(src)
+            return object_path
+
+        # Staging and the object store both live under .repo, so this is a single rename
+        try:
+            os.replace(src, object_path)
+        except FileNotFoundError:  # First object in this fan-out directory
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, object_path)
+        return object_path
+
+    def _link_or_copy(self, src, dst):
+        """
+        Hardlink src to dst, copying instead across filesystems or where hardlinks are not
+        supported. An existing dst is replaced.
+        """
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            os.unlink(dst)
+            self._link_or_copy(src, dst)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP):
+                raise
+            self._fast_copy(src, dst)
+
+    def _link_tree(self, commit_dir, tree):
+        """
+        Store a commit directory's manifest as a tree blob and link it in as its TREE_FILE.
+        """
+        tree_hash = self._write_tree(tree)
+        self._link_or_copy(self.trees_dir / tree_hash, os.path.join(commit_dir, TREE_FILE))
+        return tree_hash
+
+    def _branch_blob_hashes(self, branch_path):
+        """
+        Map each committed file under a branch directory (e.g. "commit_0/a.txt") to its blob hash.
+
+        Hashes come from the TREE_FILE manifest of each commit directory; files without one are omitted.
+        """
+        hashes = {}
+        with os.scandir(branch_path) as entries:
+            for entry in entries:
+                tree_file = os.path.join(entry.path, TREE_FILE)
+                if entry.is_dir() and os.path.exists(tree_file):
+                    with open(tree_file, "rb") as f:
+                        for name, blob_hash in orjson.loads(f.read()).items():
+                            hashes[os.path.join(entry.name, name)] = blob_hash
+        return hashes
+
+    def _is_branch_metadata(self, rel_path):
+        """
+        Whether a path relative to a branch directory is bookkeeping rather than a committed file.
+
+        Only the branch's commit counter and each commit directory's manifest qualify, so
+        committed files that merely share those basenames elsewhere are kept.
+        """
+        parts = rel_path.split(os.sep)
+        return parts == [NEXT_COMMIT_FILE] or (len(parts) == 2 and parts[1] == TREE_FILE)
+
+    def _new_commit_dir(self, branch_dir):
+        """
+        Create the next commit_<n> directory of a branch and advance its counter.
+
+        The counter in NEXT_COMMIT_FILE spares a scan of every earlier commit; branches
+        without one are counted once. Numbers already taken (e.g. by a merge) are skipped.
+
+        Returns:
+            str: Path of the new commit directory.
+        """
+        counter = os.path.join(branch_dir, NEXT_COMMIT_FILE)
+        try:
+            with open(counter, "rb") as f:
+                commit_id = int(f.read())
+        except FileNotFoundError:
+            with os.scandir(branch_dir) as entries:
+                commit_id = sum(1 for entry in entries if entry.is_dir())
+
+        while True:
+            commit_dir = os.path.join(branch_dir, f"commit_{commit_id}")
+            try:
+                os.mkdir(commit_dir)
+                break
+            except FileExistsError:
+                commit_id += 1
+
+        tmp_file = counter + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(str(commit_id + 1))
+        os.replace(tmp_file, counter)
+        return commit_dir
 
-   
-    
     def init(self):
         """
         Initialize the repository by creating the directory structure and files.
@@ -39,38 +543,67 @@ class SimpleVCS:
         self.repo_dir.mkdir(parents=True)
         self.remote_dir.mkdir(parents=True)
         self.commits_dir.mkdir()
+        self.trees_dir.mkdir()
+        self.objects_dir.mkdir()
         self.main_folder = self.commits_dir / "main"
         self.main_folder.mkdir()
-        self.branches_file.write_text(json.dumps({"main": None}))
-        self.index_file.write_text(json.dumps({}))
+        self._connection(create=True)
+        with self._db() as conn:
+            conn.executescript("""
+                CREATE TABLE "index" (path TEXT PRIMARY KEY, mtime_ns INTEGER);
+                CREATE TABLE branches (name TEXT PRIMARY KEY, commit_hash TEXT);
+                CREATE TABLE config (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            conn.execute("INSERT INTO branches VALUES (?, ?)", ("main", None))
+            conn.execute(
+                "INSERT INTO config VALUES ('object_hash', ?)",
+                (DEFAULT_HASH_ALGORITHM,),
+            )
         self.head_file.write_text("main")
         
     
         print("Repository initialized.")
 
-    def add(self, file_path):
+    def add(self, file_paths):
         """
-        Add a file to the staging area.
+        Add one or more files to the staging area.
 
         Args:
-            file_path (str): Path to the file to be added.
+            file_paths (str or list[str]): Path, or paths, of the files to be added.
         """
         if not self.repo_dir.exists():
             print("Repository not initialized. Run 'init' first.")
             return
 
-        full_path = self.repo_path / file_path
-        if not full_path.exists():
-            print(f"File '{file_path}' does not exist.")
-            return
+        if isinstance(file_paths, (str, os.PathLike)):
+            file_paths = [file_paths]
 
         staging_area = self.repo_dir / "staging"
         os.makedirs(staging_area, exist_ok=True)
-    
-        shutil.copy(full_path, staging_area)
-        print(f"File '{file_path}' added to staging area.")
-        
 
+        rows = []
+        for file_path in file_paths:
+            if os.path.basename(file_path) in RESERVED_NAMES:
+                print(f"Cannot add '{file_path}': '{os.path.basename(file_path)}' is reserved for commit metadata.")
+                continue
+            full_path = self.repo_path / file_path
+            try:
+                mtime_ns = full_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                print(f"File '{file_path}' does not exist.")
+                continue
+
+            self._fast_copy(full_path, staging_area)
+            rows.append((str(file_path), mtime_ns))
+            print(f"File '{file_path}' added to staging area.")
+
+        if not rows:
+            return
+
+        # One transaction for the whole batch; committing right away releases the write lock
+        with self._db() as conn:
+            conn.executemany('INSERT OR REPLACE INTO "index" VALUES (?, ?)', rows)
+        self.index.update(rows)
 
     def commit(self, message):
         """
@@ -83,25 +616,54 @@ class SimpleVCS:
             print("Repository not initialized. Run 'init' first.")
             return
         
-        with self.head_file.open("r") as head_file:
-            current_branch = head_file.read().strip()
+        current_branch = self.head
 
         branch_dir = self.repo_dir / "commits" / current_branch
         staging_area = self.repo_dir / "staging"
 
-        if not os.listdir(staging_area):
+        with os.scandir(staging_area) as entries:
+            staged = [(entry.name, entry.path) for entry in entries]
+        if not staged:
             print("No changes to commit.")
             return
+        reserved = [name for name, _ in staged if name in RESERVED_NAMES]
+        if reserved:
+            print(f"Cannot commit: staged files {reserved} use names reserved for commit metadata.")
+            return
 
-        commit_id = len(os.listdir(branch_dir))
-        commit_dir = os.path.join(branch_dir, f"commit_{commit_id}")
-        os.makedirs(commit_dir)
+        # Hash everything before touching the branch, so a hashing failure (e.g. blake3
+        # missing in a BLAKE3 repository) leaves no empty commit directory behind
+        hashed = [(file_name, src, self._hash_file(src)) for file_name, src in staged]
 
-        for file_name in os.listdir(staging_area):
-            shutil.move(os.path.join(staging_area, file_name), commit_dir)
+        commit_dir = self._new_commit_dir(branch_dir)
 
-        with open(os.path.join(commit_dir, "message.txt"), "w") as f:
+        # Store each staged file once by content; the commit directory only holds hardlinks
+        tree = {}
+        for file_name, src, blob_hash in hashed:
+            object_path = self._store_object(src, blob_hash)
+            self._link_or_copy(object_path, os.path.join(commit_dir, file_name))
+            tree[file_name] = blob_hash
+
+        # Write through a temporary file so an existing message.txt, which may be a hardlink
+        # into the object store, is replaced rather than written through
+        message_file = os.path.join(commit_dir, MESSAGE_FILE)
+        with open(message_file + ".tmp", "w") as f:
             f.write(message)
+        os.replace(message_file + ".tmp", message_file)
+
+        parent = self.branches[current_branch]
+        tree_hash = self._link_tree(commit_dir, tree)
+        commit_hash = self._append_commit(
+            {"message": message, "timestamp": time.time(), "parent": parent, "tree": tree_hash}
+        )
+        with self._db() as conn:
+            conn.execute(
+                "UPDATE branches SET commit_hash = ? WHERE name = ?",
+                (commit_hash, current_branch),
+            )
+            conn.execute('DELETE FROM "index"')
+        self.branches[current_branch] = commit_hash
+        self._index = {}
 
         print(f"Committed changes to {current_branch} with message: {message}")
 
@@ -109,8 +671,7 @@ class SimpleVCS:
 
     # Push changes to the remote repository
     def push(self):
-        with self.head_file.open("r") as head_file:
-            current_branch = head_file.read().strip()
+        current_branch = self.head
 
         local_branch = self.repo_dir / "commits" / current_branch
         remote_branch = self.remote_dir / "commits" / current_branch
@@ -122,49 +683,44 @@ class SimpleVCS:
         if not os.path.exists(remote_branch):
             os.makedirs(remote_branch)
 
+        pairs = []
         for commit in os.listdir(local_branch):
+            if commit == NEXT_COMMIT_FILE:
+                continue
             local_commit = os.path.join(local_branch, commit)
             remote_commit = os.path.join(remote_branch, commit)
             if not os.path.exists(remote_commit):
-                shutil.copytree(local_commit, remote_commit)
+                pairs.extend(self._tree_copy_pairs(local_commit, remote_commit))
+        # Pushed commits are never modified in place, so the remote can share their inodes
+        self._copy_files(pairs, copy_function=self._link_or_copy)
 
         print(f"Pushed changes from branch '{current_branch}' to remote.")
 
 
-    def history(self):
+    def history(self, limit=None, since=None):
         """
-        Display the commit history of the current branch.
-        """
-        if not self.repo_dir.exists():
-            print("Repository not initialized. Run 'init' first.")
-            return
+        Yield the commit history of the current branch, newest first.
 
-        with self.head_file.open("r") as head_file:
-            current_branch = head_file.read().strip()
+        Yields nothing for an uninitialized repository or a branch without commits; the
+        caller is responsible for any output.
 
-        with self.branches_file.open("r") as branches_file:
-            branches = json.load(branches_file)
+        Args:
+            limit (int, optional): Stop after this many commits.
+            since (float, optional): Stop at the first commit older than this Unix timestamp.
 
-        commit_hash = branches.get(current_branch)
-        if not commit_hash:
-            print(f"No commits in branch '{current_branch}'.")
+        Yields:
+            tuple: (commit_hash, timestamp, message) for each commit.
+        """
+        if not self.repo_dir.exists():
             return
 
-        print(f"Commit history for branch '{current_branch}':")
-
-        while commit_hash:
-            commit_path = self.commits_dir / commit_hash
-            if not commit_path.exists():
-                break
-
-            with commit_path.open("r") as commit_file:
-                commit_data = json.load(commit_file)
-                timestamp = time.strftime(
-                    "%Y-%m-%d %H:%M:%S", time.localtime(commit_data["timestamp"])
-                )
-                print(f"- {commit_hash[:7]} | {timestamp} | {commit_data['message']}")
-
-            commit_hash = commit_data.get("parent")
+        commit_hash = self.branches.get(self.head)
+        for count, commit in enumerate(self._walk_commits(commit_hash)):
+            if limit is not None and count >= limit:
+                return
+            if since is not None and commit[1] < since:
+                return
+            yield commit
 
     def create_branch(self, branch_name):
         """
@@ -174,26 +730,22 @@ class SimpleVCS:
             print("Repository not initialized. Run 'init' first.")
             return
 
-        with self.head_file.open("r") as head_file:
-            current_branch = head_file.read().strip()
+        current_branch = self.head
 
-        with self.branches_file.open("r+") as branches_file:
-            branches = json.load(branches_file)
-            if branch_name in branches:
-                print(f"Branch '{branch_name}' already exists.")
-                return
+        if branch_name in self.branches:
+            print(f"Branch '{branch_name}' already exists.")
+            return
 
-            branches[branch_name] = branches[current_branch]
-            branches_file.seek(0)
-            json.dump(branches, branches_file)
-            branches_file.truncate()
+        commit_hash = self.branches[current_branch]
+        with self._db() as conn:
+            conn.execute("INSERT INTO branches VALUES (?, ?)", (branch_name, commit_hash))
+        self.branches[branch_name] = commit_hash
 
-            
-            new_branch_path = self.repo_dir / "commits" / branch_name
+        new_branch_path = self.repo_dir / "commits" / branch_name
 
-            os.makedirs(new_branch_path)
+        os.makedirs(new_branch_path)
 
-            print(f"Branch '{branch_name}' created.")
+        print(f"Branch '{branch_name}' created.")
 
     def list_branches(self):
         """
@@ -203,14 +755,10 @@ class SimpleVCS:
             print("Repository not initialized. Run 'init' first.")
             return
 
-        with self.head_file.open("r") as head_file:
-            current_branch = head_file.read().strip()
-
-        with self.branches_file.open("r") as branches_file:
-            branches = json.load(branches_file)
+        current_branch = self.head
 
         print("Branches:")
-        for branch, commit in branches.items():
+        for branch, commit in self.branches.items():
             marker = "*" if branch == current_branch else " "
             commit_display = commit[:7] if commit else "None"
             logger.info(f"{marker} {branch} ({commit_display})")
@@ -224,14 +772,15 @@ class SimpleVCS:
             print("Repository not initialized. Run 'init' first.")
             return
 
-        with self.branches_file.open("r") as branches_file:
-            branches = json.load(branches_file)
-            if branch_name not in branches:
-                print(f"Error: Branch '{branch_name}' does not exist.")
-                return
+        if branch_name not in self.branches:
+            print(f"Error: Branch '{branch_name}' does not exist.")
+            return
 
-        with self.head_file.open("w") as head_file:
-            head_file.write(branch_name)
+        # Replace HEAD rather than rewriting it, so its inode changes even when the new
+        # name has the same length and lands in the same mtime tick
+        tmp_file = self.head_file.with_suffix(".tmp")
+        tmp_file.write_text(branch_name)
+        os.replace(tmp_file, self.head_file)
 
         print(f"Switched to branch '{branch_name}'.")
 
@@ -248,22 +797,138 @@ class SimpleVCS:
             print("Error: Branch name is required.")
             return
 
-        with self.branches_file.open("r") as branches_file:
-            branches = json.load(branches_file)
-
-        if branch_name not in branches:
+        if branch_name not in self.branches:
             print(f"Error: Branch '{branch_name}' does not exist.")
             return
 
         # Get the commit hash for the selected branch
-        commit_hash = branches[branch_name]
+        commit_hash = self.branches[branch_name]
 
         # Clear the staging area (index) when switching branches
-        with self.index_file.open("w") as index:
-            json.dump({}, index)
+        with self._db() as conn:
+            conn.execute('DELETE FROM "index"')
+        self._index = {}
 
         print(f"Workspace switched to branch '{branch_name}'. Staging area cleared.")
 
+    def _fast_copy(self, src, dst):
+        """
+        Copy a file with its metadata like shutil.copy2, keeping the data inside the kernel.
+
+        Tries a copy-on-write reflink first, then os.copy_file_range, then os.sendfile, and
+        falls back to a userspace copy through one reused 1 MiB buffer. A filesystem that
+        rejects the reflink is remembered, so bulk copies on it skip straight to the fallbacks.
+        An existing dst is unlinked rather than overwritten, so hardlinked objects are never
+        modified in place.
+        """
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        try:
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+            src_stat = os.fstat(src_fd)
+            size = src_stat.st_size
+            copied = False
+
+            if fcntl is not None and src_stat.st_dev not in self._no_reflink_devs:
+                try:
+                    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                    copied = True
+                except OSError as e:
+                    # EXDEV only says this pair spans filesystems; anything else means the
+                    # filesystem has no reflink support
+                    if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL):
+                        self._no_reflink_devs.add(src_stat.st_dev)
+
+            if not copied and hasattr(os, "copy_file_range"):
+                try:
+                    remaining = size
+                    while remaining > 0:
+                        sent = os.copy_file_range(src_fd, dst_fd, remaining)
+                        if sent == 0:
+                            break
+                        remaining -= sent
+                    copied = remaining == 0
+                except OSError:
+                    pass
+
+            if not copied and hasattr(os, "sendfile"):
+                try:
+                    offset = 0
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+                    while offset < size:
+                        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                        if sent == 0:
+                            break
+                        offset += sent
+                    copied = offset == size
+                except OSError:
+                    pass
+
+            if not copied:
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                buf = bytearray(COPY_BUFSIZE)
+                view = memoryview(buf)
+                while True:
+                    n = fsrc.readinto(buf)
+                    if not n:
+                        break
+                    fdst.write(view[:n])
+
+        shutil.copystat(src, dst)
+        return dst
+
+    def _copy_files(self, pairs, copy_function=None):
+        """
+        Copy (src, dst) file pairs on a thread pool.
+
+        Destination directories must already exist, so workers never race on mkdir.
+
+        Args:
+            pairs (list): (src, dst) file pairs.
+            copy_function (callable, optional): Called as copy_function(src, dst); defaults
+                to _fast_copy().
+        """
+        if not pairs:
+            return
+        copy_function = copy_function or self._fast_copy
+        with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+            # Draining the results re-raises the first failed copy
+            list(executor.map(lambda pair: copy_function(*pair), pairs))
+
+    def _tree_copy_pairs(self, src, dst):
+        """
+        Create dst and its subdirectories mirroring src, and list the files to copy.
+
+        Like shutil.copytree, symlinked directories are followed and their contents copied;
+        a link back into one of its own ancestors is skipped, as following it never ends.
+        Unlike shutil.copytree this does not copy directory metadata, only files.
+
+        Returns:
+            list: (src_file, dst_file) pairs for _copy_files().
+        """
+        pairs = []
+        for root, dirs, files in os.walk(src, followlinks=True):
+            linked = [name for name in dirs if os.path.islink(os.path.join(root, name))]
+            if linked:
+                real_root = os.path.join(os.path.realpath(root), "")
+                for name in linked:
+                    real_target = os.path.join(os.path.realpath(os.path.join(root, name)), "")
+                    if real_root.startswith(real_target):
+                        logger.warning(f"Skipping symlink loop: {os.path.join(root, name)}")
+                        dirs.remove(name)
+            target_root = os.path.join(dst, os.path.relpath(root, src))
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                pairs.append((os.path.join(root, name), os.path.join(target_root, name)))
+        return pairs
+
     def clone(self, target_path):
         """Clone the repository to the target path."""
         target = Path(target_path)
@@ -274,11 +939,24 @@ class SimpleVCS:
         target.mkdir(parents=True)
 
         # Ensure .repo directory exists
-        if not self.repo_dir.exists() or not (self.repo_dir / "branches.json").exists():
+        if not self.repo_dir.exists() or not self.db_file.exists():
             raise FileNotFoundError(f"Source repository is missing required files.'{self.repo_dir}'")
 
-        # Copy the `.repo` directory to the target
-        shutil.copytree(self.repo_dir, target / ".repo")
+        # Share immutable objects, trees and commits with the source; copy the database,
+        # commit pack and other files that are updated in place
+        target_repo = target / ".repo"
+        target_repo.mkdir()
+        links = []
+        pairs = []
+        with os.scandir(self.repo_dir) as entries:
+            for entry in entries:
+                target_item = target_repo / entry.name
+                if not entry.is_dir():
+                    pairs.append((entry.path, target_item))
+                elif entry.name in SHARED_DIRS:
+                    links.extend(self._tree_copy_pairs(entry.path, target_item))
+                else:
+                    pairs.extend(self._tree_copy_pairs(entry.path, target_item))
 
         # Copy all non-hidden files and directories to the target
         for item in self.repo_path.iterdir():
@@ -286,18 +964,42 @@ class SimpleVCS:
                 continue
             target_item = target / item.name
             if item.is_dir():
-                shutil.copytree(item, target_item)
+                pairs.extend(self._tree_copy_pairs(item, target_item))
             else:
-                shutil.copy2(item, target_item)
+                pairs.append((item, target_item))
+
+        self._copy_files(links, copy_function=self._link_or_copy)
+        self._copy_files(pairs)
 
         print(f"Repository cloned successfully to {target}")
 
     def add_ignore(self, patterns):
         with self.ignore_file.open('a') as f:
-            f.writelines(f"{pattern}\n" for pattern in patterns)
+            f.write("\n".join(patterns) + "\n")
+        self._ignore_cache = None  # Don't rely on mtime granularity to notice the append
         print("Ignore patterns added.")
 
 
+    def _iter_files(self, root):
+        """
+        Recursively yield os.DirEntry objects for all files under root, skipping the .repo directory.
+
+        Entries carry the file type from the directory listing and cache their stat result,
+        so callers avoid extra stat calls per file. Directories are walked from an explicit
+        stack rather than nested generators, so each entry is yielded once regardless of depth
+        and only one directory handle is open at a time.
+        """
+        stack = [root]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.name == ".repo":
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        yield entry
+
     def status(self):
         """
         Display the status of the working directory compared to the staging area.
@@ -306,56 +1008,112 @@ class SimpleVCS:
             logger.warning("Repository not initialized. Run 'init' first.")
             return
 
-        ignored = self.get_ignored_files()
+        is_ignored = self._ignore_predicate()
 
-        with self.index_file.open("r") as index:
-            staging_area = json.load(index)
+        staging_area = self.index
 
-        working_dir_files = {}
-        for root, _, files in os.walk(self.repo_path):
-            for file in files:
-                if ".repo" in root or any(Path(file).match(pattern) for pattern in ignored):
-                    continue
-                full_path = Path(root) / file
-                working_dir_files[str(full_path.relative_to(self.repo_path))] = full_path.stat().st_mtime
+        repo_root = os.path.join(str(self.repo_path), "")
+        prefix = len(repo_root)
+        working_dir_files = {
+            entry.path[prefix:]: entry.stat(follow_symlinks=False).st_mtime_ns
+            for entry in self._iter_files(repo_root)
+            if not is_ignored(entry.name)
+        }
+
+        # Compare whole (path, mtime_ns) sets at C level instead of probing per file; integer
+        # nanoseconds compare exactly where float seconds can round
+        modified = sorted(path for path, _ in working_dir_files.items() - staging_area.items())
+        deleted = sorted(staging_area.keys() - working_dir_files.keys())
 
         logger.info("Changes not staged for commit:")
-        for file, mtime in working_dir_files.items():
-            if file not in staging_area or staging_area[file] != mtime:
-                logger.info(f"  modified: {file}")
+        for file in modified:
+            logger.info(f"  modified: {file}")
 
         logger.info("\nChanges staged for commit:")
-        for file in staging_area.keys():
-            if file not in working_dir_files:
-                logger.info(f"  deleted: {file}")
+        for file in deleted:
+            logger.info(f"  deleted: {file}")
 
-    def get_ignored_files(self):
+    def _read_ignore_patterns(self):
         ignored = []
         if self.ignore_file.exists():
             with self.ignore_file.open() as f:
-                ignored = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+                # Drop repeated patterns (e.g. from calling add_ignore twice), keeping file order
+                ignored = list(dict.fromkeys(
+                    line.strip() for line in f if line.strip() and not line.startswith('#')
+                ))
         return ignored
 
+    def get_ignored_files(self):
+        """
+        Return a single compiled regex matching any pattern in the ignore file.
+
+        The regex is rebuilt only when the ignore file's mtime or size changes. With no
+        patterns it matches nothing, so callers can always use ignored.match(name).
+        """
+        try:
+            st = self.ignore_file.stat()
+            key = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            key = None
+
+        if self._ignore_cache is None or self._ignore_cache[0] != key:
+            patterns = self._read_ignore_patterns()
+            regex = "|".join(fnmatch.translate(p) for p in patterns) if patterns else "(?!)"
+            self._ignore_cache = (key, re.compile(regex))
+        return self._ignore_cache[1]
+
+    def _ignore_predicate(self):
+        """
+        Return a name -> bool check against the ignore patterns, memoized per basename.
+
+        Basenames such as __init__.py repeat across directories, so repeats skip the regex.
+        The memo is dropped whenever get_ignored_files() compiles a new pattern.
+        """
+        pattern = self.get_ignored_files()
+        if self._ignore_matcher is None or self._ignore_matcher[0] is not pattern:
+            matches = lru_cache(maxsize=8192)(lambda name: pattern.match(name) is not None)
+            self._ignore_matcher = (pattern, matches)
+        return self._ignore_matcher[1]
+
     def list_files(self):
         """List all files in the repository that are not ignored."""
-        ignored = self.get_ignored_files()  # Assuming this function retrieves the ignored patterns
+        is_ignored = self._ignore_predicate()
         
         # Iterate over files in the repository path
-        for root, _, files in os.walk(self.repo_path):
-            for file in files:
-                # Check if the file matches any ignored pattern
-                if not any(Path(file).match(pattern) for pattern in ignored):
-                    # Log the file that will be yielded
-                    logger.info(f"File: {file}")
-                    yield file
+        for entry in self._iter_files(self.repo_path):
+            file = entry.name
+            # Check if the file matches any ignored pattern
+            if not is_ignored(file):
+                # Log the file that will be yielded
+                logger.info(f"File: {file}")
+                yield file
 
     def get_files_in_directory(self,directory):
-        """Recursively get all files in a directory and its subdirectories."""
-        files = []
-        for root, dirs, filenames in os.walk(directory):
-            for filename in filenames:
-                files.append(os.path.relpath(os.path.join(root, filename), directory))
-        return files
+        """Recursively yield the paths of all files in a directory and its subdirectories, relative to it."""
+        directory = os.path.join(os.fspath(directory), "")
+        for entry in self._iter_files(directory):
+            yield entry.path[len(directory):]
+
+    def _files_equal(self, path1, path2, block_size=65536):
+        """
+        Return True if both files have identical contents.
+
+        Files of different sizes are rejected from their stat alone. Otherwise both files
+        are mmapped and compared window by window, stopping at the first differing window.
+        """
+        size = os.stat(path1).st_size
+        if size != os.stat(path2).st_size:
+            return False
+        if size == 0:
+            return True
+
+        with open(path1, "rb") as f1, open(path2, "rb") as f2, \
+                mmap.mmap(f1.fileno(), 0, access=mmap.ACCESS_READ) as m1, \
+                mmap.mmap(f2.fileno(), 0, access=mmap.ACCESS_READ) as m2:
+            for offset in range(0, size, block_size):
+                if m1[offset:offset + block_size] != m2[offset:offset + block_size]:
+                    return False
+        return True
 
     def diff(self,branch1, branch2):
         """
@@ -373,8 +1131,8 @@ class SimpleVCS:
 
         try:
             # Get all files (including subdirectories) in both branches
-            branch1_files = set(self.get_files_in_directory(branch1))
-            branch2_files = set(self.get_files_in_directory(branch2))
+            branch1_files = {f for f in self.get_files_in_directory(branch1) if not self._is_branch_metadata(f)}
+            branch2_files = {f for f in self.get_files_in_directory(branch2) if not self._is_branch_metadata(f)}
 
             print(f"Files in Branch 1: {branch1_files}")
             print(f"Files in Branch 2: {branch2_files}")
@@ -388,23 +1146,53 @@ class SimpleVCS:
             print(f"Added files in Branch 2: {added_files}")
             print(f"Removed files from Branch 1: {removed_files}")
 
+            # Files recorded in both trees under the same algorithm compare by blob hash;
+            # only the rest are read, concurrently
+            hashes1 = self._branch_blob_hashes(branch1)
+            hashes2 = self._branch_blob_hashes(branch2)
+            common_files = list(common_files)
+            identical_files = {
+                file for file in common_files
+                if file in hashes1 and file in hashes2 and hashes1[file] == hashes2[file]
+            }
+            unhashed = [
+                file for file in common_files
+                if not self._hashes_comparable(hashes1.get(file), hashes2.get(file))
+            ]
+            with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+                same = executor.map(
+                    self._files_equal,
+                    [os.path.join(branch1, file) for file in unhashed],
+                    [os.path.join(branch2, file) for file in unhashed],
+                )
+                identical_files.update(file for file, equal in zip(unhashed, same) if equal)
+
             # Compare common files
             for file in common_files:
                 path1 = os.path.join(branch1, file)
                 path2 = os.path.join(branch2, file)
 
                 if os.path.isfile(path1) and os.path.isfile(path2):
+                    if file in identical_files:
+                        print(f"No differences in file: {file}")
+                        continue
+
+                    # unified_diff needs indexable sequences, but its output is a generator:
+                    # write hunks as they are produced rather than building one big string
                     with open(path1, 'r') as f1, open(path2, 'r') as f2:
                         content1 = f1.readlines()
                         content2 = f2.readlines()
 
-                    file_diff = list(unified_diff(content1, content2, 
-                                                  fromfile=f"Branch 1: {file}", 
-                                                  tofile=f"Branch 2: {file}"))
+                    file_diff = unified_diff(content1, content2,
+                                             fromfile=f"Branch 1: {file}",
+                                             tofile=f"Branch 2: {file}")
 
-                    if file_diff:
+                    first_line = next(file_diff, None)
+                    if first_line is not None:
                         print(f"Differences in file: {file}")
-                        print(''.join(file_diff))
+                        sys.stdout.write(first_line)
+                        sys.stdout.writelines(file_diff)
+                        print()
                     else:
                         print(f"No differences in file: {file}")
 
@@ -429,18 +1217,71 @@ class SimpleVCS:
             print("One or both branches do not exist.")
             return
 
-        conflicts = []
-
-        for file in source_path.rglob('*'):
-            if file.is_file():
-                rel_path = file.relative_to(source_path)
-                target_file = target_path / rel_path
-                file_name = os.path.basename(file)
-                if target_file.exists() and file_name != "message.txt" and file.read_bytes() != target_file.read_bytes():
-                    conflicts.append(file)  # Convert Path to string
+        pairs = []
+        for root, _, files in os.walk(source_path):
+            rel_root = os.path.relpath(root, source_path)
+            for name in files:
+                rel_path = name if rel_root == "." else os.path.join(rel_root, name)
+                if self._is_branch_metadata(rel_path):
+                    continue
+                pairs.append((rel_path, os.path.join(root, name), os.path.join(target_path, rel_path)))
+
+        # Detect conflicts before touching the target branch: files recorded in both trees
+        # under the same algorithm compare by blob hash, the rest are read concurrently
+        source_hashes = self._branch_blob_hashes(source_path)
+        target_hashes = self._branch_blob_hashes(target_path)
+        identical = set()
+        conflicting = set()
+        unhashed = []
+        for rel_path, file, target_file in pairs:
+            if os.path.basename(file) == MESSAGE_FILE or not os.path.exists(target_file):
+                continue
+            source_hash = source_hashes.get(rel_path)
+            target_hash = target_hashes.get(rel_path)
+            if self._hashes_comparable(source_hash, target_hash):
+                if source_hash == target_hash:
+                    identical.add(rel_path)
                 else:
-                    target_file.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(file, target_file)
+                    conflicting.add(rel_path)
+            else:
+                unhashed.append((rel_path, file, target_file))
+
+        with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+            same = executor.map(
+                self._files_equal,
+                [file for _, file, _ in unhashed],
+                [target_file for _, _, target_file in unhashed],
+            )
+            for (rel_path, _, _), equal in zip(unhashed, same):
+                (identical if equal else conflicting).add(rel_path)
+
+        conflicts = [file for rel_path, file, _ in pairs if rel_path in conflicting]
+
+        merged_trees = {}
+        copies = []
+        for rel_path, file, target_file in pairs:
+            if rel_path in conflicting or rel_path in identical:
+                continue
+            copies.append((file, target_file))
+            if rel_path in source_hashes:
+                commit_name, name = os.path.split(rel_path)
+                merged_trees.setdefault(commit_name, {})[name] = source_hashes[rel_path]
+
+        for target_dir in {os.path.dirname(target_file) for _, target_file in copies}:
+            os.makedirs(target_dir, exist_ok=True)
+        # Committed files are never modified in place, so both branches can share them
+        self._copy_files(copies, copy_function=self._link_or_copy)
+
+        # Record the merged files in the target commits' manifests
+        for commit_name, entries in merged_trees.items():
+            commit_dir = os.path.join(target_path, commit_name)
+            tree_file = os.path.join(commit_dir, TREE_FILE)
+            tree = {}
+            if os.path.exists(tree_file):
+                with open(tree_file, "rb") as f:
+                    tree = orjson.loads(f.read())
+            tree.update(entries)
+            self._link_tree(commit_dir, tree)
 
         if conflicts:
             print(f"Conflicts detected: {conflicts}")  # Log conflicts as a string list
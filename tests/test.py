@@ -1,15 +1,16 @@
 import unittest
 import os
-import json
+import errno
+import re
+import fnmatch
+import hashlib
+import sqlite3
 import tempfile
 import shutil
 from pathlib import Path
 from unittest.mock import patch
 from simple_vcs import SimpleVCS
 
-@patch('builtins.print')  # Mock print
-@patch('logging.error')  # Mock logger.error
-
 class TestSimpleVCS(unittest.TestCase):
     def setUp(self):
         # Create a temporary directory for testing
@@ -17,7 +18,8 @@ class TestSimpleVCS(unittest.TestCase):
         self.vcs = SimpleVCS(self.test_dir)
 
     def tearDown(self):
-        # Remove the temporary directory after the test
+        # Close the database, then remove the temporary directory after the test
+        self.vcs.close()
         shutil.rmtree(self.test_dir)
 
     def test_init(self):
@@ -31,11 +33,22 @@ class TestSimpleVCS(unittest.TestCase):
         
         # Ensure the necessary files and directories exist
         self.assertTrue((repo_dir / 'commits').exists())
-        self.assertTrue((repo_dir / 'branches.json').exists())
-        self.assertTrue((repo_dir / 'index.json').exists())
+        self.assertTrue((repo_dir / 'repo.db').exists())
         self.assertTrue((repo_dir / 'HEAD').exists())
 
 
+    def test_old_json_repository_is_rejected(self):
+        """Test that a repository from the JSON-file format fails clearly and is left untouched."""
+        repo_dir = Path(self.test_dir) / ".repo"
+        (repo_dir / "commits" / "main").mkdir(parents=True)
+        (repo_dir / "branches.json").write_text('{"main": null}')
+        (repo_dir / "index.json").write_text("{}")
+        (repo_dir / "HEAD").write_text("main")
+
+        with self.assertRaisesRegex(RuntimeError, "format too old"):
+            self.vcs.list_branches()
+        self.assertFalse(self.vcs.db_file.exists())
+
     def test_add_file(self):
         """Test adding a file to the staging area."""
         self.vcs.init()
@@ -44,9 +57,24 @@ class TestSimpleVCS(unittest.TestCase):
         
         self.vcs.add("test.txt")
         
-        with open(self.vcs.index_file, "r") as f:
-            staging_area = json.load(f)
+        with sqlite3.connect(self.vcs.db_file) as conn:
+            staging_area = dict(conn.execute('SELECT path, mtime_ns FROM "index"'))
         self.assertIn("test.txt", staging_area)
+        self.assertEqual(staging_area["test.txt"], test_file.stat().st_mtime_ns)
+
+    def test_add_releases_write_lock(self):
+        """Test that another instance can write to the database right after add()."""
+        self.vcs.init()
+        (Path(self.test_dir) / "test.txt").write_text("Hello, World!")
+        self.vcs.add("test.txt")
+
+        other = SimpleVCS(self.test_dir)
+        other._connection().execute("PRAGMA busy_timeout = 0")
+        other.create_branch("feature")
+        other.close()
+
+        self.assertIn("feature", self.vcs.branches)
+        self.assertIn("test.txt", self.vcs.index)
 
     def test_commit(self):
         """Test committing changes."""
@@ -58,8 +86,8 @@ class TestSimpleVCS(unittest.TestCase):
         self.vcs.commit("Initial commit")
         
         # Check if commit was added
-        with open(self.vcs.branches_file, "r") as f:
-            branches = json.load(f)
+        with sqlite3.connect(self.vcs.db_file) as conn:
+            branches = dict(conn.execute("SELECT name, commit_hash FROM branches"))
         
         current_branch = Path(self.test_dir) / ".repo" / "HEAD"
         with open(current_branch, "r") as f:
@@ -67,15 +95,195 @@ class TestSimpleVCS(unittest.TestCase):
         
         commit_hash = branches.get(branch_name)
         self.assertIsNotNone(commit_hash)
-        self.assertTrue((self.vcs.commits_dir / commit_hash).exists())
+        index = self.vcs._map(self.vcs.pack_index_file)
+        self.assertIsNotNone(self.vcs._find_commit(index, commit_hash))
+
+    def test_commit_index_links_parents(self):
+        """Test that every commit can be found in the sorted index and points at its parent."""
+        self.vcs.init()
+        test_file = Path(self.test_dir) / "test.txt"
+        hashes = []
+        for i in range(5):
+            test_file.write_text(f"Version {i}")
+            self.vcs.add("test.txt")
+            self.vcs.commit(f"Commit {i}")
+            hashes.append(self.vcs.branches["main"])
+
+        index = self.vcs._map(self.vcs.pack_index_file)
+        parents = [self.vcs._find_commit(index, h)[2] for h in hashes]
+        self.assertIsNone(self.vcs._find_commit(index, "0" * 40))
+        self.assertEqual(parents, [None] + hashes[:-1])
+
+    def test_history_limit_and_since(self):
+        """Test that history yields newest commits first and stops early on request."""
+        self.vcs.init()
+        test_file = Path(self.test_dir) / "test.txt"
+        for i in range(4):
+            test_file.write_text(f"Version {i}")
+            self.vcs.add("test.txt")
+            self.vcs.commit(f"Commit {i}")
+
+        messages = [message for _, _, message in self.vcs.history()]
+        self.assertEqual(messages, ["Commit 3", "Commit 2", "Commit 1", "Commit 0"])
+
+        limited = [message for _, _, message in self.vcs.history(limit=2)]
+        self.assertEqual(limited, ["Commit 3", "Commit 2"])
+
+        newest = next(self.vcs.history())
+        self.assertEqual(list(self.vcs.history(since=newest[1] + 1)), [])
+
+    def test_commit_numbering_skips_merged_commits(self):
+        """Test that commit directories are numbered from the counter without clobbering merged ones."""
+        self.vcs.init()
+        test_file = Path(self.test_dir) / "test.txt"
+        for i in range(2):
+            test_file.write_text(f"Version {i}")
+            self.vcs.add("test.txt")
+            self.vcs.commit(f"Commit {i}")
+
+        self.vcs.create_branch("feat")
+        self.vcs.merge("main", "feat")
+        self.vcs.switch_branch("feat")
+        test_file.write_text("Feature")
+        self.vcs.add("test.txt")
+        self.vcs.commit("Feature commit")
+
+        feat_dir = self.vcs.commits_dir / "feat"
+        self.assertEqual((feat_dir / "commit_2" / "message.txt").read_text(), "Feature commit")
+        self.assertEqual((feat_dir / ".next").read_text(), "3")
+
+    def test_history_is_silent_without_commits(self):
+        """Test that history yields nothing and prints nothing when there is no history."""
+        with patch("builtins.print") as mock_print:
+            self.assertEqual(list(self.vcs.history()), [])
+            self.vcs.init()
+            mock_print.reset_mock()
+            self.assertEqual(list(self.vcs.history()), [])
+        mock_print.assert_not_called()
+
+    def test_commit_deduplicates_content(self):
+        """Test that identical content is stored once and shared between commits."""
+        self.vcs.init()
+        test_file = Path(self.test_dir) / "test.txt"
+        test_file.write_text("Hello, World!")
+
+        self.vcs.add("test.txt")
+        self.vcs.commit("Initial commit")
+        self.vcs.add("test.txt")
+        self.vcs.commit("Same content again")
+
+        # One blob and one tree back both commits
+        objects = [name for _, _, files in os.walk(self.vcs.objects_dir) for name in files]
+        self.assertEqual(len(objects), 1)
+        self.assertEqual(len(os.listdir(self.vcs.trees_dir)), 1)
+
+        branch_dir = self.vcs.commits_dir / "main"
+        first = branch_dir / "commit_0" / "test.txt"
+        second = branch_dir / "commit_1" / "test.txt"
+        self.assertEqual(second.read_text(), "Hello, World!")
+        self.assertTrue(os.path.samefile(first, second))
+
+        tree_hash = os.listdir(self.vcs.trees_dir)[0]
+        self.assertIn("test.txt", self.vcs._read_tree(tree_hash))
+
+    def test_commit_message_does_not_overwrite_objects(self):
+        """Test that a file named like the commit metadata cannot corrupt stored objects."""
+        self.vcs.init()
+        (Path(self.test_dir) / "message.txt").write_text("hello")
+        (Path(self.test_dir) / "other.txt").write_text("hello")
+
+        self.vcs.add(["message.txt", "other.txt"])
+        self.assertNotIn("message.txt", self.vcs.index)
+        self.vcs.commit("first commit msg")
+
+        commit_dir = self.vcs.commits_dir / "main" / "commit_0"
+        self.assertEqual((commit_dir / "other.txt").read_text(), "hello")
+        self.assertEqual((commit_dir / "message.txt").read_text(), "first commit msg")
+        objects = [Path(root, name) for root, _, files in os.walk(self.vcs.objects_dir) for name in files]
+        self.assertEqual([obj.read_text() for obj in objects], ["hello"])
+
+        # A reserved name already sitting in staging is refused before any commit is made
+        (self.vcs.repo_dir / "staging" / "message.txt").write_text("hello")
+        self.vcs.commit("second commit msg")
+        self.assertFalse((self.vcs.commits_dir / "main" / "commit_1").exists())
+
+    def test_commit_keeps_files_named_like_metadata(self):
+        """Test that committed files named tree.json or .next are stored and compared like any other."""
+        self.vcs.init()
+        for name in ("tree.json", ".next"):
+            (Path(self.test_dir) / name).write_text("user data")
+        self.vcs.add(["tree.json", ".next"])
+        self.vcs.commit("Initial commit")
+
+        commit_dir = self.vcs.commits_dir / "main" / "commit_0"
+        self.assertEqual((commit_dir / "tree.json").read_text(), "user data")
+        self.assertEqual((commit_dir / ".next").read_text(), "user data")
+        self.assertEqual(set(self.vcs._branch_blob_hashes(self.vcs.commits_dir / "main")),
+                         {os.path.join("commit_0", "tree.json"), os.path.join("commit_0", ".next")})
+
+        self.vcs.create_branch("feat")
+        self.vcs.merge("main", "feat")
+        feat_commit = self.vcs.commits_dir / "feat" / "commit_0"
+        self.assertEqual((feat_commit / "tree.json").read_text(), "user data")
+        self.assertEqual((feat_commit / ".next").read_text(), "user data")
+
+    def test_object_hash_algorithm_is_pinned(self):
+        """Test that objects are hashed with the algorithm recorded in the repository."""
+        self.vcs.init()
+        with self.vcs._db() as conn:
+            conn.execute("UPDATE config SET value = 'sha1' WHERE key = 'object_hash'")
+        self.vcs._hash_algorithm = None
+
+        test_file = Path(self.test_dir) / "test.txt"
+        test_file.write_text("Hello, World!")
+        self.assertEqual(self.vcs._hash_file(test_file), hashlib.sha1(b"Hello, World!").hexdigest())
+
+    def test_commit_without_blake3_leaves_no_commit_dir(self):
+        """Test that a commit failing to hash its files does not create a commit directory."""
+        self.vcs.init()
+        with self.vcs._db() as conn:
+            conn.execute("UPDATE config SET value = 'blake3' WHERE key = 'object_hash'")
+        self.vcs._hash_algorithm = None
+
+        (Path(self.test_dir) / "test.txt").write_text("Hello, World!")
+        self.vcs.add("test.txt")
+        with patch("simple_vcs.blake3", None), self.assertRaises(RuntimeError):
+            self.vcs.commit("Initial commit")
+
+        branch_dir = self.vcs.commits_dir / "main"
+        self.assertEqual(os.listdir(branch_dir), [])
+        self.assertIsNone(self.vcs.branches["main"])
+
+    def test_merge_compares_mixed_hash_algorithms_by_content(self):
+        """Test that identical files hashed with different algorithms do not conflict."""
+        self.vcs.init()
+        test_file = Path(self.test_dir) / "a.txt"
+        test_file.write_text("Same content")
+        self.vcs.add("a.txt")
+        self.vcs.commit("Initial commit")
+
+        # Recreate the commit on another branch as if hashed with a 64-character algorithm
+        self.vcs.create_branch("feat")
+        feat_commit = self.vcs.commits_dir / "feat" / "commit_0"
+        feat_commit.mkdir()
+        (feat_commit / "a.txt").write_text("Same content")
+        (feat_commit / "message.txt").write_text("Initial commit")
+        self.vcs._link_tree(feat_commit, {"a.txt": "f" * 64})
+
+        with patch("builtins.print") as mock_print:
+            self.vcs.merge("feat", "main")
+        self.assertFalse(any(
+            call.args and str(call.args[0]).startswith("Conflicts detected")
+            for call in mock_print.call_args_list
+        ))
 
     def test_create_branch(self):
         """Test creating a new branch."""
         self.vcs.init()
         self.vcs.create_branch("feature")
         
-        with open(self.vcs.branches_file, "r") as f:
-            branches = json.load(f)
+        with sqlite3.connect(self.vcs.db_file) as conn:
+            branches = dict(conn.execute("SELECT name, commit_hash FROM branches"))
         
         self.assertIn("feature", branches)
 
@@ -91,6 +299,18 @@ class TestSimpleVCS(unittest.TestCase):
         
         self.assertEqual(current_branch, "feature")
 
+    def test_head_follows_switch_from_other_instance(self):
+        """Test that a cached HEAD notices a branch switch made by another process."""
+        self.vcs.init()
+        self.vcs.create_branch("feat")
+        self.assertEqual(self.vcs.head, "main")
+
+        other = SimpleVCS(self.test_dir)
+        other.switch_branch("feat")
+        other.close()
+
+        self.assertEqual(self.vcs.head, "feat")
+
     def test_list_branches(self):
         """Test listing branches."""
         self.vcs.init()  # Initialize the repository
@@ -121,6 +341,23 @@ class TestSimpleVCS(unittest.TestCase):
         self.assertIn("Changes staged for commit:", log.output[1])  # Adjusted to match order if needed
 
 
+    def test_status_reports_modified_and_deleted(self):
+        """Test that status lists files changed or removed since they were staged."""
+        self.vcs.init()
+        for name in ("a.txt", "b.txt", "c.txt"):
+            (Path(self.test_dir) / name).write_text(name)
+        self.vcs.add(["a.txt", "b.txt", "c.txt"])
+
+        os.utime(Path(self.test_dir) / "a.txt", (0, 0))
+        os.remove(Path(self.test_dir) / "b.txt")
+
+        with self.assertLogs('SimpleVCS', level='INFO') as log:
+            self.vcs.status()
+
+        self.assertIn("INFO:SimpleVCS:  modified: a.txt", log.output)
+        self.assertIn("INFO:SimpleVCS:  deleted: b.txt", log.output)
+        self.assertFalse(any("c.txt" in line for line in log.output))
+
     def test_clone(self):
         """Test cloning a repository."""
         # Prepare the test repository
@@ -137,8 +374,8 @@ class TestSimpleVCS(unittest.TestCase):
         repo_dir = Path(self.test_dir) / ".repo"
         assert repo_dir.exists(), f"Repository directory '{repo_dir}' does not exist."
 
-        branches_file = repo_dir / "branches.json"
-        assert branches_file.exists(), f"Branches file '{branches_file}' is missing in the source repository."
+        db_file = repo_dir / "repo.db"
+        assert db_file.exists(), f"Database file '{db_file}' is missing in the source repository."
 
         try:
             # Ensure the directory is clean
@@ -151,22 +388,72 @@ class TestSimpleVCS(unittest.TestCase):
             # Verify the cloned repository
             clone_vcs = SimpleVCS(clone_dir)
 
-            # Check if branches file exists in the cloned repository
-            branches_file = clone_vcs.repo_dir / "branches.json"
-            self.assertTrue(branches_file.exists(), "Branches file missing in cloned repository.")
+            # Check if database file exists in the cloned repository
+            db_file = clone_vcs.db_file
+            self.assertTrue(db_file.exists(), "Database file missing in cloned repository.")
             
 
             # Verify branch content
-            with open(branches_file, "r") as f:
-                branches = json.load(f)
+            with sqlite3.connect(db_file) as conn:
+                branches = dict(conn.execute("SELECT name, commit_hash FROM branches"))
             self.assertIn("main", branches, "Branch 'main' not found in cloned repository.")
             
         finally:
-            with open(branches_file, "r") as f:
-                branches = json.load(f)
+            with sqlite3.connect(db_file) as conn:
+                branches = dict(conn.execute("SELECT name, commit_hash FROM branches"))
         
             self.assertIn("main", branches)
 
+    def test_clone_hardlinks_committed_files(self):
+        """Test that a clone shares committed files with the source but copies the database."""
+        self.vcs.init()
+        test_file = Path(self.test_dir) / "test.txt"
+        test_file.write_text("Hello, World!")
+        self.vcs.add("test.txt")
+        self.vcs.commit("Initial commit")
+
+        clone_dir = Path(tempfile.mkdtemp()) / "clone"
+        try:
+            self.vcs.clone(clone_dir)
+            committed = Path(".repo") / "commits" / "main" / "commit_0" / "test.txt"
+            self.assertTrue(os.path.samefile(Path(self.test_dir) / committed, clone_dir / committed))
+            self.assertFalse(os.path.samefile(self.vcs.db_file, clone_dir / ".repo" / "repo.db"))
+            self.assertFalse(os.path.samefile(test_file, clone_dir / "test.txt"))
+        finally:
+            shutil.rmtree(clone_dir.parent)
+
+    def test_clone_follows_symlinked_directories(self):
+        """Test that clone copies the contents of symlinked subdirectories."""
+        self.vcs.init()
+        external = Path(tempfile.mkdtemp())
+        clone_dir = Path(tempfile.mkdtemp()) / "clone"
+        try:
+            (external / "g.txt").write_text("linked data")
+            (Path(self.test_dir) / "src").mkdir()
+            os.symlink(external, Path(self.test_dir) / "src" / "linked")
+            os.symlink("..", Path(self.test_dir) / "src" / "loop")
+
+            with self.assertLogs('SimpleVCS', level='WARNING'):
+                self.vcs.clone(clone_dir)
+
+            self.assertEqual((clone_dir / "src" / "linked" / "g.txt").read_text(), "linked data")
+            self.assertFalse((clone_dir / "src" / "loop").exists())
+        finally:
+            shutil.rmtree(external)
+            shutil.rmtree(clone_dir.parent)
+
+    def test_fast_copy_remembers_missing_reflink(self):
+        """Test that a filesystem rejecting reflinks is not asked again."""
+        src = Path(self.test_dir) / "src.txt"
+        src.write_text("Hello, World!")
+
+        with patch("fcntl.ioctl", side_effect=OSError(errno.EOPNOTSUPP, "no reflink")) as ioctl:
+            self.vcs._fast_copy(src, Path(self.test_dir) / "copy1.txt")
+            self.vcs._fast_copy(src, Path(self.test_dir) / "copy2.txt")
+
+        self.assertEqual(ioctl.call_count, 1)
+        self.assertEqual((Path(self.test_dir) / "copy2.txt").read_text(), "Hello, World!")
+
     def test_get_ignored_files(self):
         """Test get_ignored_files function."""
         # Create a sample .gitignore file
@@ -174,9 +461,20 @@ class TestSimpleVCS(unittest.TestCase):
         
         ignored_files = self.vcs.get_ignored_files()
         
-        self.assertIn("*.log", ignored_files)
-        self.assertIn("*.tmp", ignored_files)
-        self.assertNotIn("# Comment", ignored_files)
+        self.assertTrue(ignored_files.match("debug.log"))
+        self.assertTrue(ignored_files.match("cache.tmp"))
+        self.assertFalse(ignored_files.match("# Comment"))
+        self.assertFalse(ignored_files.match("notes.txt"))
+
+    def test_ignore_predicate_follows_add_ignore(self):
+        """Test that memoized ignore checks pick up newly added patterns."""
+        self.vcs.add_ignore(["*.log"])
+        is_ignored = self.vcs._ignore_predicate()
+        self.assertTrue(is_ignored("debug.log"))
+        self.assertFalse(is_ignored("cache.tmp"))
+
+        self.vcs.add_ignore(["*.tmp"])
+        self.assertTrue(self.vcs._ignore_predicate()("cache.tmp"))
 
     def test_list_files(self):
         """Test list_files function."""
@@ -191,7 +489,7 @@ class TestSimpleVCS(unittest.TestCase):
         self.vcs.ignore_file.write_text("*.log\n")
         
         # Mock the get_ignored_files method to simulate ignoring files
-        with patch.object(self.vcs, 'get_ignored_files', return_value=["*.log"]):
+        with patch.object(self.vcs, 'get_ignored_files', return_value=re.compile(fnmatch.translate("*.log"))):
             files = list(self.vcs.list_files())
 
         self.assertIn("file1.txt", files)